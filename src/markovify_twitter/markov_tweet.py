@@ -1,8 +1,12 @@
 import argparse
+import itertools
 import os
 import random
 import sys
 
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 from markovify_twitter.twitter_util import (
@@ -14,9 +18,9 @@ from markovify_twitter.twitter_util import (
 
 from markovify_twitter.util import (
     blue,
+    compile_removal_pattern,
     green,
     red,
-    remove_words,
     TWITTER_MENTION_PATTERN,
     URL_PATTERN
 )
@@ -34,9 +38,6 @@ class MarkovTweet():
     MAX_OVERLAP_TOTAL = 15
     MAX_CHARS = 140
 
-    rejoined_text = ''
-    rejoined_text_lower = ''
-
     # These words will be removed from any renerated tweet
     # All words should be lower-case
     WORDS_TO_REMOVE = ['rt']
@@ -48,10 +49,39 @@ class MarkovTweet():
     # Dir/File to save generated tweets in
     GENERATED_TWEETS_DIR = os.path.join(os.path.dirname(__file__), 'generated_tweets')
     GENERATED_TWEETS_FILE = os.path.join(GENERATED_TWEETS_DIR, 'generated_tweets.csv')
+    GENERATED_TWEETS_INDEX_FILE = os.path.join(GENERATED_TWEETS_DIR, 'generated_tweets.idx')
     TWEET_DELIMITER = '__(ಠ_ಠ)__'
 
     def __init__(self):
         self.parser = self.create_parser()
+        self.removal_pattern = compile_removal_pattern(self.WORDS_TO_REMOVE, self.PATTERNS_TO_REMOVE)
+
+        # Every distinct word is interned to a small int ID so the chain
+        # can be keyed by tuples of ints rather than joined strings
+        self._intern = {}
+        self._words = []
+
+        # Lower-case tweets the chain is built from, and their k-grams
+        # keyed by k, used to reject tweets that copy the source text
+        self.source_tweets_lower = []
+        self._source_kgrams = {}
+
+        # Chain last passed to build_random_tweet and its flattened
+        # arrays, so repeated calls on one chain only flatten it once
+        self._linear_chain = None
+
+    def _intern_word(self, word):
+        """
+        Returns the int ID for the word, assigning a new one if needed
+
+        :param word: The word to intern
+        """
+        word_id = self._intern.get(word)
+        if word_id is None:
+            word_id = len(self._words)
+            self._intern[word] = word_id
+            self._words.append(word)
+        return word_id
 
     def build_markov_chain_from_tweets(self, tweets, key_length, chain=None):
         """
@@ -61,6 +91,9 @@ class MarkovTweet():
         :param tweets: List of lists; Outer list is list of tweets,
                        inner list is list of words in a tweet
         :param key_length: Number of words to use in the chain
+            * NOTE: Keys are tuples of interned word IDs (a bare word ID when
+                    key_length is 1), and so are the successors, so the chain
+                    is only usable with this instance
         :param chain: Existing chain or None.
                       Multiple chains can be combined.
             EXAMPLE:
@@ -70,88 +103,191 @@ class MarkovTweet():
         if chain is None:
             chain = {}
 
+        # The chain may be one that was already flattened, which is
+        # about to go stale
+        self._linear_chain = None
+
         # Limit the key length since at some point, original tweet
         # generation will be impossible
         if key_length > self.MAX_KEY_LENGTH:
             key_length = self.MAX_KEY_LENGTH
 
+        if key_length == 1:
+            return self._build_k1_chain(tweets, chain)
+
         for tweet in tweets:
 
-            index = key_length
-            _begin = True
-            for i in range(len(tweet) - key_length):
-
-                # Build list of sentence[index]'s previous key_length words
-                # to use as a key for the dictionary
-                keys = [tweet[index-i] for i in range(key_length, 0, -1)]
-                key = ' '.join(keys)
-
-                # Keep track of what words begin a tweet
-                if _begin:
-                    if BEGIN in chain:
-                        chain[BEGIN].append(key)
-                    else:
-                        chain[BEGIN] = [key]
-                    _begin = False
-
-                if key in chain:
-                    chain[key].append(tweet[index])
-                else:
-                    chain[key] = [tweet[index]]
-                index += 1
+            # Map the tweet to a compact array of word IDs once, rather
+            # than per key
+            tweet_ids = array('i', map(self._intern_word, tweet))
+
+            # Keep track of what words begin a tweet, stored as the
+            # ready-made key tuple so generation can start from it directly
+            if len(tweet_ids) > key_length:
+                chain.setdefault(BEGIN, []).append(tuple(tweet_ids[:key_length]))
+
+            for index in range(key_length, len(tweet_ids)):
+
+                # Use sentence[index]'s previous key_length word IDs
+                # as a key for the dictionary
+                key = tuple(tweet_ids[index-key_length:index])
+                chain.setdefault(key, []).append(tweet_ids[index])
 
         return chain
 
+    def _build_k1_chain(self, tweets, chain):
+        """
+        build_markov_chain_from_tweets for the default key_length of 1,
+        keyed by single word IDs so no key tuples are built at all
+
+        :param tweets: List of lists of words, one list per tweet
+        :param chain: Existing chain to add to
+        """
+        for tweet in tweets:
+            tweet_ids = array('i', map(self._intern_word, tweet))
+            if len(tweet_ids) > 1:
+                chain.setdefault(BEGIN, []).append(tweet_ids[0])
+            for word, next_word in zip(tweet_ids, tweet_ids[1:]):
+                chain.setdefault(word, []).append(next_word)
+        return chain
+
     def build_random_tweet(self, chain, key_length, users=[], msg_len=25, tries=10):
         """
         Attemps to generate a random tweet based off the chain
 
         :param chain: The markov chain to use
+            * NOTE: The chain is flattened and cached the first time it is used
+                    here, so once used it must only be changed through
+                    build_markov_chain_from_tweets, never by editing the dict
         :param key_length: The number of words in the chain's keys
             * NOTE: Needs to be the same as what was used for build_markov_chain_from_tweets
         :param msg_len: Maximum number of words in the tweet
         :param tries: Maximum number of attempts to generate an original tweet
         """
-        for i in range(tries):
+        end_id = self._intern_word(END)
+        if self._linear_chain is None or self._linear_chain[0] is not chain:
+            self._linear_chain = (chain, self._linearize_chain(chain, end_id))
+        linear_chain = self._linear_chain[1]
+        random_walk = self._random_walk_k1 if key_length == 1 else self._random_walk
 
-            # Get a key from the words that begin a sentence
-            words = random.choice(chain[BEGIN]).split(' ')
-            sentence = list(words)  # Need a copy of words, sentence = words won't work
+        # Draw the starting key for every try up front, from the words
+        # that begin a sentence
+        starts = random.choices(chain[BEGIN], k=tries)
+
+        for start in starts:
 
             # Generate a maximum of msg_len words for the sentence
-            invalid = False
-            for i in range(msg_len - key_length - len(users)):
-                try:
-                    next_word = random.choice(chain[' '.join(words)])
-                    if next_word == END:
-                        sentence = remove_words(sentence, self.WORDS_TO_REMOVE, self.PATTERNS_TO_REMOVE)
-                        sentence += [f'@{u}' for u in users]
-                        if self.test_generated_tweet(sentence):
-                            return ' '.join(sentence), True
-                        else:
-                            invalid = True
-                            break
-                    sentence.append(next_word)
-                    del words[0]
-                    words.append(next_word)
-                except KeyError:
-                    # Print something to let user know an error occured
-                    print('t(\'-\')t', end='')
-
-            # If here, reached msg_len OR invalid sentence
-            # Make sure sentence ends with punctuation
-            if not invalid:
+            sentence, reached_end = random_walk(start, linear_chain, end_id, msg_len - key_length - len(users))
+            sentence = self._words_from_ids(sentence)
+
+            # If the sentence was cut off at msg_len,
+            # make sure it ends with punctuation
+            if not reached_end:
                 if not sentence[-1][-1] in '.?!':
-                    end = sentence[-1]
-                    del sentence[-1]
-                    sentence.append(f'{end}{random.choice(list(".?!"))}')
-                sentence = remove_words(sentence, self.WORDS_TO_REMOVE, self.PATTERNS_TO_REMOVE)
-                sentence += [f'@{u}' for u in users]
-                if self.test_generated_tweet(sentence):
-                    return ' '.join(sentence), True
+                    sentence[-1] = f'{sentence[-1]}{random.choice(".?!")}'
+            sentence = self._remove_words(sentence)
+            sentence += [f'@{u}' for u in users]
+            if self.test_generated_tweet(sentence):
+                return ' '.join(sentence), True
 
         return 'UNABLE TO GENERATE ORIGINAL TWEET', False
 
+    def _random_walk(self, start, linear_chain, end_id, max_words):
+        """
+        Walks the chain from start, picking a random successor each step
+
+        :param start: Key tuple of word IDs to start from
+        :param linear_chain: The chain as returned by _linearize_chain
+        :param end_id: Word ID of END
+        :param max_words: Maximum number of words to add after start
+        :returns: Tuple of (list of word IDs, whether END was reached)
+        """
+        key_index, offsets, lengths, successors = linear_chain
+        randrange = random.randrange
+
+        # Keys with no successors fall through to the last row,
+        # whose only successor is END
+        dead_end = len(offsets) - 1
+
+        # words only ever holds the last key_length word IDs
+        words = deque(start, maxlen=len(start))
+        sentence = list(start)
+        for i in range(max_words):
+            row = key_index.get(tuple(words), dead_end)
+            next_word = successors[offsets[row] + randrange(lengths[row])]
+            if next_word == end_id:
+                return sentence, True
+            sentence.append(next_word)
+            words.append(next_word)
+        return sentence, False
+
+    def _random_walk_k1(self, start, linear_chain, end_id, max_words):
+        """
+        _random_walk for a key_length of 1, where the key is just the
+        current word ID and no key tuples need to be built
+        """
+        key_index, offsets, lengths, successors = linear_chain
+        randrange = random.randrange
+        dead_end = len(offsets) - 1
+
+        word = start
+        sentence = [start]
+        for i in range(max_words):
+            row = key_index.get(word, dead_end)
+            word = successors[offsets[row] + randrange(lengths[row])]
+            if word == end_id:
+                return sentence, True
+            sentence.append(word)
+        return sentence, False
+
+    def _linearize_chain(self, chain, end_id):
+        """
+        Flattens the chain's successor lists into one contiguous array
+        so generation indexes ints instead of following list objects
+
+        :param chain: The markov chain to flatten
+        :param end_id: Word ID of END
+        :returns: Tuple of (key_index, offsets, lengths, successors) where
+                  key_index maps a key to its row, and row's successors are
+                  successors[offsets[row]:offsets[row] + lengths[row]].
+                  The last row is not in key_index and only leads to END,
+                  for keys that were never followed by anything
+        """
+        keys = [key for key in chain if key != BEGIN]
+        rows = [chain[key] for key in keys]
+        key_index = dict(zip(keys, range(len(keys))))
+
+        # Each array is built by a single call iterating in C, rather
+        # than appending one row at a time from Python
+        lengths = array('i', map(len, rows))
+        offsets = array('i', [0])
+        offsets.extend(itertools.accumulate(lengths))
+        successors = array('i', itertools.chain.from_iterable(rows))
+
+        # offsets already ends with the start of the dead end row
+        lengths.append(1)
+        successors.append(end_id)
+        return key_index, offsets, lengths, successors
+
+    def _remove_words(self, words):
+        """
+        Removes any word matching WORDS_TO_REMOVE or PATTERNS_TO_REMOVE
+
+        :param words: List of words in the tweet
+        """
+        if self.removal_pattern is None:
+            return list(words)
+        match = self.removal_pattern.match
+        return [word for word in words if not match(word)]
+
+    def _words_from_ids(self, word_ids):
+        """
+        Converts a list of interned word IDs back into words
+
+        :param word_ids: List of word IDs
+        """
+        return [self._words[word_id] for word_id in word_ids]
+
     def test_generated_tweet(self, words, max_chars=140):
         """
         Checks if the generated tweet was original or not
@@ -162,19 +298,39 @@ class MarkovTweet():
 
         # If too many words overlap with a sentence
         # direct from the text, reject that sentence.
+        # An empty tweet is trivially found in the source text
+        if not words:
+            return False
         combined = ' '.join(words)
-        if len(combined) > 140:
+        if len(combined) > max_chars:
             return False
         overlap_ratio = int(round(self.MAX_OVERLAP_RATIO * len(words)))
         overlap_max = min(self.MAX_OVERLAP_TOTAL, overlap_ratio)
         overlap_over = overlap_max + 1
-        gram_count = max((len(words) - overlap_max), 1)
-        grams = [words[i:i+overlap_over] for i in range(gram_count)]
-        for g in grams:
-            gram_joined = ' '.join(g)
-            if gram_joined.lower() in self.rejoined_text_lower:
-                return False
-        return True
+        gram_count = len(words) - overlap_max
+        source_kgrams = self._get_source_kgrams(overlap_over)
+
+        # Lower-case the tweet in one pass, then every gram is just a slice.
+        # Grams are generated lazily so the first copied one stops the scan
+        words_lower = [word.lower() for word in words]
+        return not any(tuple(words_lower[i:i+overlap_over]) in source_kgrams
+                       for i in range(gram_count))
+
+    def _get_source_kgrams(self, k):
+        """
+        Returns the set of lower-case k-word sequences found in the
+        source tweets, building it the first time k is requested
+
+        :param k: Number of words in each sequence
+        """
+        kgrams = self._source_kgrams.get(k)
+        if kgrams is None:
+            kgrams = set()
+            for tweet_lower in self.source_tweets_lower:
+                for i in range(len(tweet_lower) - k + 1):
+                    kgrams.add(tuple(tweet_lower[i:i+k]))
+            self._source_kgrams[k] = kgrams
+        return kgrams
 
     def save_tweet(self, tweet, users):
         """
@@ -187,21 +343,43 @@ class MarkovTweet():
         if not os.path.exists(self.GENERATED_TWEETS_DIR):
             os.mkdir(self.GENERATED_TWEETS_DIR)
 
-        # For some reason, fp.readlines() always returned [] when
-        # using 'a+' mode. Might revisit later, but this works
-        # Probably has to do with seeking to beginning of file
-        last_tweet_id = -1
-        next_tweet_id = 0
-        if os.path.exists(self.GENERATED_TWEETS_FILE):
-            with open(self.GENERATED_TWEETS_FILE, 'r') as fp:
-                lines = fp.readlines()
-                if lines:
-                    last_tweet_id = int(lines[-1].split(self.TWEET_DELIMITER)[0])
-                next_tweet_id = str(last_tweet_id + 1)
-
-        with open(self.GENERATED_TWEETS_FILE, 'a+') as fp:
-            tstamp = datetime.now().strftime('%B %d, %Y %H:%M:%S')
-            fp.write(f'{self.TWEET_DELIMITER}'.join([next_tweet_id, tweet] + users + [tstamp]) + '\n')
+        next_tweet_id = str(self._claim_tweet_id())
+
+        # Append-only binary write, the csv is never read back here
+        tstamp = datetime.now().strftime('%B %d, %Y %H:%M:%S')
+        line = f'{self.TWEET_DELIMITER}'.join([next_tweet_id, tweet] + users + [tstamp]) + '\n'
+        with open(self.GENERATED_TWEETS_FILE, 'ab', buffering=65536) as fp:
+            fp.write(line.encode('utf-8'))
+
+    def _claim_tweet_id(self):
+        """
+        Returns the next generated tweet ID and advances the counter
+        stored in GENERATED_TWEETS_INDEX_FILE, so the csv is never read
+
+        The counter is an 8 byte little-endian unsigned int. If it is
+        missing or truncated, or the csv it counts for is gone, it is
+        reseeded from the last line of the csv
+        """
+        tweet_id = None
+        if os.path.exists(self.GENERATED_TWEETS_FILE) and os.path.exists(self.GENERATED_TWEETS_INDEX_FILE):
+            with open(self.GENERATED_TWEETS_INDEX_FILE, 'rb') as fp:
+                counter = fp.read(8)
+            if len(counter) == 8:
+                tweet_id = int.from_bytes(counter, 'little')
+
+        if tweet_id is None:
+            tweet_id = 0
+            if os.path.exists(self.GENERATED_TWEETS_FILE):
+                last_line = ''
+                with open(self.GENERATED_TWEETS_FILE, 'r', encoding='utf-8') as fp:
+                    for last_line in fp:
+                        pass
+                if last_line:
+                    tweet_id = int(last_line.split(self.TWEET_DELIMITER)[0]) + 1
+
+        with open(self.GENERATED_TWEETS_INDEX_FILE, 'wb') as fp:
+            fp.write((tweet_id + 1).to_bytes(8, 'little'))
+        return tweet_id
 
     def run(self, args=None):
         """
@@ -216,18 +394,25 @@ class MarkovTweet():
 
         if args.keep_urls and URL_PATTERN in self.PATTERNS_TO_REMOVE:
             self.PATTERNS_TO_REMOVE.remove(URL_PATTERN)
+            self.removal_pattern = compile_removal_pattern(self.WORDS_TO_REMOVE, self.PATTERNS_TO_REMOVE)
 
         users = args.users
         key_length = args.key_length or 1
 
-        # Combine tweet history of all users provided
-        tweets = []
-        for user in users:
-            tweets += get_all_tweets(user)
-
-        # Rejoin the tweets into a string separated by '\n', also store lowercase version
-        self.rejoined_text = '\n'.join([' '.join([word for word in tweet]) for tweet in tweets])
-        self.rejoined_text_lower = self.rejoined_text.lower()
+        # Combine tweet history of all users provided, fetching each
+        # user concurrently since the time is spent waiting on twitter.
+        # Each user is only fetched once, so two threads never write the
+        # same stash file, but repeated users still count once per mention
+        unique_users = list(dict.fromkeys(users))
+        with ThreadPoolExecutor(max_workers=len(unique_users)) as executor:
+            fetched = dict(zip(unique_users, executor.map(get_all_tweets, unique_users)))
+        tweets = [tweet for user in users for tweet in fetched[user]]
+
+        # Keep a lower-case copy of the source tweets to check generated
+        # tweets against, normalized once here instead of on every check.
+        # Interned so each distinct word is one shared str in every k-gram
+        self.source_tweets_lower = [[sys.intern(word.lower()) for word in tweet] for tweet in tweets]
+        self._source_kgrams = {}
 
         title = f' Tweet from {" and ".join(users)} '
         s = f' {title}--> key_len: {key_length} '
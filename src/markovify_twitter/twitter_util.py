@@ -32,8 +32,9 @@ def get_all_tweets(screen_name):
     :returns: List of tweets, where each tweet is a list of words
     """
 
-    if not os.path.exists(TWEET_STASH_DIR):
-        os.mkdir(TWEET_STASH_DIR)
+    # May be called for several users at once, so tolerate the
+    # directory being created by another call
+    os.makedirs(TWEET_STASH_DIR, exist_ok=True)
 
     if os.path.exists(f'{TWEET_STASH_DIR}/{screen_name}_tweets.csv'):
         with open(f'{TWEET_STASH_DIR}/{screen_name}_tweets.csv') as fp:
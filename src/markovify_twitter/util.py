@@ -61,6 +61,25 @@ def get_word_frequency(text):
     return freqs
 
 
+def compile_removal_pattern(words_to_remove=[], patterns_to_remove=[]):
+    """
+    Combines the words and patterns to remove into a single regex, so
+    each word only needs one match call to decide whether to drop it
+
+    :param words_to_remove: List of words that should be removed
+        * NOTE: Matched case-insensitively against the whole word
+    :param patterns_to_remove: List of regex patterns to remove
+    :returns: Compiled regex, or None if there is nothing to remove
+    """
+    alternatives = [f'({pattern})' for pattern in patterns_to_remove]
+    if words_to_remove:
+        words_joined = '|'.join(re.escape(word) for word in words_to_remove)
+        alternatives.append(f'(?i:{words_joined})\\Z')
+    if not alternatives:
+        return None
+    return re.compile('|'.join(alternatives))
+
+
 def remove_words(list_of_words, words_to_remove=[], patterns_to_remove=[]):
     """
     Removes the words in the list words_to_remove from the
@@ -72,23 +91,7 @@ def remove_words(list_of_words, words_to_remove=[], patterns_to_remove=[]):
         * NOTE: All words should be lower-case
     :param patterns_to_remove: List of regex patterns to remove
     """
-
-    pruned_list = []
-    patterns_joined = '|'.join(f'({pattern})' for pattern in patterns_to_remove)
-    if patterns_joined:
-        p = re.compile(patterns_joined)
-
-    for word in list_of_words:
-        append = True
-
-        if word.lower() in words_to_remove:
-            append = False
-
-        # This check will short-circuit if patterns_joined is '', which
-        # will be the case if patterns_to_remove is an empty list
-        if patterns_joined and p.match(word):
-            append = False
-
-        if append:
-            pruned_list.append(word)
-    return pruned_list
+    p = compile_removal_pattern(words_to_remove, patterns_to_remove)
+    if p is None:
+        return list(list_of_words)
+    return [word for word in list_of_words if not p.match(word)]
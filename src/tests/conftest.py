@@ -0,0 +1,6 @@
+import os
+
+# markovify_twitter.twitter_util reads the twitter credentials when it is
+# imported. The tests never talk to twitter, so any value will do
+for name in ['CONSUMER_KEY', 'CONSUMER_SECRET', 'ACCESS_KEY', 'ACCESS_SECRET']:
+    os.environ.setdefault(f'TWITTER_API_{name}', 'test')
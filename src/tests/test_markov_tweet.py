@@ -0,0 +1,149 @@
+import os
+
+import pytest
+
+from markovify_twitter import markov_tweet as markov_tweet_module
+from markovify_twitter.markov_tweet import MarkovTweet
+from markovify_twitter.twitter_util import BEGIN, END
+
+
+@pytest.fixture
+def markov_tweet(monkeypatch, tmp_path):
+    me = MarkovTweet()
+    generated_dir = tmp_path / 'generated_tweets'
+    monkeypatch.setattr(me, 'GENERATED_TWEETS_DIR', str(generated_dir))
+    monkeypatch.setattr(me, 'GENERATED_TWEETS_FILE', str(generated_dir / 'generated_tweets.csv'))
+    monkeypatch.setattr(me, 'GENERATED_TWEETS_INDEX_FILE', str(generated_dir / 'generated_tweets.idx'))
+    return me
+
+
+def chain_as_words(me, chain):
+    """
+    Converts a chain of word IDs back into words, with k=1 keys as 1-tuples
+    """
+    def key_words(key):
+        key = key if isinstance(key, tuple) else (key,)
+        return tuple(me._words_from_ids(key))
+
+    words = {BEGIN: [key_words(start) for start in chain[BEGIN]]}
+    for key, next_words in chain.items():
+        if key != BEGIN:
+            words[key_words(key)] = me._words_from_ids(next_words)
+    return words
+
+
+@pytest.mark.parametrize('key_length, expected_result', [
+    (1, {('a',): ['b', 'b'], ('b',): ['c', END], ('c',): [END]}),
+    (2, {('a', 'b'): ['c', END], ('b', 'c'): [END]}),
+])
+def test_build_markov_chain_from_tweets(markov_tweet, key_length, expected_result):
+    tweets = [['a', 'b', 'c', END], ['a', 'b', END]]
+    chain = markov_tweet.build_markov_chain_from_tweets(tweets, key_length)
+    result = chain_as_words(markov_tweet, chain)
+    assert result.pop(BEGIN) == [('a', 'b')[:key_length]] * 2
+    assert result == expected_result
+
+
+@pytest.mark.parametrize('key_length', [1, 2, 3])
+def test_build_random_tweet_follows_only_path(markov_tweet, key_length):
+    chain = markov_tweet.build_markov_chain_from_tweets([['one', 'two', 'three', 'four', 'five', END]], key_length)
+    assert markov_tweet.build_random_tweet(chain, key_length) == ('one two three four five', True)
+
+
+@pytest.mark.parametrize('key_length', [1, 2])
+def test_build_random_tweet_dead_end_ends_tweet(markov_tweet, key_length):
+    # No END after 'five', so its key has nothing following it
+    chain = markov_tweet.build_markov_chain_from_tweets([['one', 'two', 'three', 'four', 'five']], key_length)
+    assert markov_tweet.build_random_tweet(chain, key_length) == ('one two three four five', True)
+
+
+def saved_ids(me):
+    with open(me.GENERATED_TWEETS_FILE, encoding='utf-8') as fp:
+        return [int(line.split(me.TWEET_DELIMITER)[0]) for line in fp]
+
+
+def test_save_tweet_into_empty_dir(markov_tweet):
+    markov_tweet.save_tweet('first tweet', ['some_user'])
+    with open(markov_tweet.GENERATED_TWEETS_FILE, encoding='utf-8') as fp:
+        fields = fp.read().rstrip('\n').split(markov_tweet.TWEET_DELIMITER)
+    assert fields[:3] == ['0', 'first tweet', 'some_user']
+
+
+def test_save_tweet_consecutive(markov_tweet):
+    for i in range(3):
+        markov_tweet.save_tweet(f'tweet {i}', ['some_user'])
+    assert saved_ids(markov_tweet) == [0, 1, 2]
+
+
+def test_save_tweet_seeds_from_existing_csv(markov_tweet, tmp_path):
+    (tmp_path / 'generated_tweets').mkdir()
+    with open(markov_tweet.GENERATED_TWEETS_FILE, 'w', encoding='utf-8') as fp:
+        fp.write(markov_tweet.TWEET_DELIMITER.join(['7', 'old tweet', 'some_user', 'then']) + '\n')
+    markov_tweet.save_tweet('new tweet', ['some_user'])
+    assert saved_ids(markov_tweet) == [7, 8]
+
+
+@pytest.mark.parametrize('stale_counter', [b'', b'\x05\x00'])
+def test_save_tweet_reseeds_truncated_index(markov_tweet, stale_counter):
+    markov_tweet.save_tweet('tweet 0', ['some_user'])
+    markov_tweet.save_tweet('tweet 1', ['some_user'])
+    with open(markov_tweet.GENERATED_TWEETS_INDEX_FILE, 'wb') as fp:
+        fp.write(stale_counter)
+    markov_tweet.save_tweet('tweet 2', ['some_user'])
+    assert saved_ids(markov_tweet) == [0, 1, 2]
+
+
+def test_save_tweet_reseeds_when_csv_removed(markov_tweet):
+    markov_tweet.save_tweet('tweet 0', ['some_user'])
+    markov_tweet.save_tweet('tweet 1', ['some_user'])
+    os.remove(markov_tweet.GENERATED_TWEETS_FILE)
+    markov_tweet.save_tweet('tweet 2', ['some_user'])
+    assert saved_ids(markov_tweet) == [0]
+
+
+@pytest.mark.parametrize('words, expected_result', [
+    ([], False),
+    (['The', 'quick', 'brown', 'fox'], False),
+    (['BROWN', 'Fox', 'jumps', 'away'], False),
+    # Only matched across a partial word in the source, 'he' of 'the'
+    (['he', 'quick', 'brown', 'dog'], True),
+    (['brown', 'quick', 'fox', 'the'], True),
+    # Grams do not run across the end of one source tweet into the next
+    (['fox', 'jumps', 'the', 'quick'], True),
+    (['x' * 141], False),
+])
+def test_test_generated_tweet(markov_tweet, words, expected_result):
+    markov_tweet.source_tweets_lower = [['the', 'quick', 'brown', 'fox', 'jumps'], ['the', 'quick', 'fox']]
+    assert markov_tweet.test_generated_tweet(words) == expected_result
+
+
+@pytest.mark.parametrize('key_length', [1, 2])
+def test_build_random_tweet_rejects_copied_tweet(markov_tweet, key_length):
+    tweets = [['one', 'two', 'three', 'four', 'five', END]]
+    markov_tweet.source_tweets_lower = [[word.lower() for word in tweet] for tweet in tweets]
+    chain = markov_tweet.build_markov_chain_from_tweets(tweets, key_length)
+    assert markov_tweet.build_random_tweet(chain, key_length) == ('UNABLE TO GENERATE ORIGINAL TWEET', False)
+
+
+def test_run_fetches_repeated_users_once(markov_tweet, monkeypatch):
+    calls = []
+
+    def get_all_tweets(user):
+        calls.append(user)
+        return [[user, 'says', 'hi', END]]
+
+    built_from = []
+    build_chain = markov_tweet.build_markov_chain_from_tweets
+
+    def build_markov_chain_from_tweets(tweets, key_length):
+        built_from.extend(tweets)
+        return build_chain(tweets, key_length)
+
+    monkeypatch.setattr(markov_tweet_module, 'get_all_tweets', get_all_tweets)
+    monkeypatch.setattr(markov_tweet, 'build_markov_chain_from_tweets', build_markov_chain_from_tweets)
+    monkeypatch.setattr('builtins.input', lambda prompt: 'n')
+    args = markov_tweet.parser.parse_args(['foo', 'bar', 'foo'])
+    markov_tweet.run(args)
+
+    assert sorted(calls) == ['bar', 'foo']
+    assert [tweet[0] for tweet in built_from] == ['foo', 'bar', 'foo']
@@ -1,6 +1,7 @@
 import pytest
 
 from markovify_twitter.util import (
+    compile_removal_pattern,
     get_word_frequency,
     remove_words,
     sanitize,
@@ -25,6 +26,23 @@ def test_remove_words(list_of_words, words_to_remove, patterns_to_remove, expect
     assert result == expected_result
 
 
+@pytest.mark.parametrize('words_to_remove, patterns_to_remove, word, expected_result', [
+    ([], [], 'anything', None),
+    (['rt'], [], 'RT', True),
+    (['rt'], [], 'rtx', False),
+    (['a.b'], [], 'axb', False),
+    (['rt'], [TWITTER_MENTION_PATTERN], '@some_user,', True),
+    (['rt'], [URL_PATTERN], 'https://some_url.com', True),
+    (['rt'], [TWITTER_MENTION_PATTERN, URL_PATTERN], 'words', False),
+])
+def test_compile_removal_pattern(words_to_remove, patterns_to_remove, word, expected_result):
+    p = compile_removal_pattern(words_to_remove, patterns_to_remove)
+    if expected_result is None:
+        assert p is None
+    else:
+        assert bool(p.match(word)) == expected_result
+
+
 @pytest.mark.parametrize('text, expected_result', [
     ('', {}),
     ('Some text here', {'Some': 1, 'text': 1, 'here': 1}),